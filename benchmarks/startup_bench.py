@@ -0,0 +1,88 @@
+"""
+Startup benchmark for USB Backup Manager.
+
+Measures the import cost of main.py with `python -X importtime` and the vault
+check done by DbInit.initalize_all on an already initialised vault, then fails
+if either exceeds its budget. Run from the repository root:
+
+    python benchmarks/startup_bench.py
+"""
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from statistics import median
+from subprocess import run
+from sys import executable, exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+REPO_ROOT: Path = Path(__file__).resolve().parent.parent
+sys_path.insert(0, str(REPO_ROOT))
+
+IMPORT_BUDGET_MS: float = 150.0
+PROBE_BUDGET_MS: float = 5.0
+EAGER_MODULES: tuple = ("utils.input_handler", "utils.vault_merge", "encryption.metadata_cipher")
+
+
+def import_time_ms(module: str) -> float:
+    result = run([executable, "-X", "importtime", "-c", f"import {module}"],
+                 cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"No importtime entry for {module}")
+
+
+def eagerly_loaded() -> list:
+    # Importing the packages alone must not pull in their submodules
+    result = run([executable, "-c", "import sys, utils, encryption; print(' '.join(sys.modules))"],
+                 cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    loaded = set(result.stdout.split())
+    return [module for module in EAGER_MODULES if module in loaded]
+
+
+def probe_time_ms(runs: int) -> float:
+    from utils.db_utils import DbInit
+
+    with TemporaryDirectory() as tmp, redirect_stdout(StringIO()):
+        db_init = DbInit(Path(tmp) / "db")
+        db_init.initalize_all()
+
+        timings = []
+        for _ in range(runs):
+            start = perf_counter()
+            db_init.initalize_all()
+            timings.append((perf_counter() - start) * 1000)
+
+    return median(timings)
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Check startup time against its budget")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS, help="ms for `import main`")
+    parser.add_argument("--probe-budget", type=float, default=PROBE_BUDGET_MS, help="ms for DbInit.initalize_all")
+    args = parser.parse_args()
+
+    # The first run compiles bytecode, so it is not counted
+    import_time_ms("main")
+    import_ms = median(import_time_ms("main") for _ in range(args.runs))
+    probe_ms = probe_time_ms(args.runs)
+    eager = eagerly_loaded()
+
+    print(f"import main:            {import_ms:8.1f} ms (budget {args.import_budget:.1f} ms)")
+    print(f"DbInit.initalize_all:   {probe_ms:8.2f} ms (budget {args.probe_budget:.2f} ms)")
+    print(f"eager package imports:  {', '.join(eager) or 'none'}")
+
+    failed = import_ms > args.import_budget or probe_ms > args.probe_budget or bool(eager)
+    if failed:
+        print("Startup budget exceeded")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys_exit(main())
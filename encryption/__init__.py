@@ -1,10 +1,21 @@
 """
 Encryption package for USB Backup Manager.
 Contains modules for key management and encryption/decryption operations.
+Exports are resolved lazily so importing one submodule does not load the rest.
 """ 
 
-from encryption.master_key_manager import MasterKeyManager
-from encryption.crypto_handler import CryptoHandler
+from importlib import import_module
 
-__all__ = ['MasterKeyManager', 'CryptoHandler']
+_EXPORTS = {
+    'MasterKeyManager': 'encryption.master_key_manager',
+    'CryptoHandler': 'encryption.crypto_handler',
+    'MetadataCipher': 'encryption.metadata_cipher',
+}
 
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_EXPORTS[name]), name)
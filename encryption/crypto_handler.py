@@ -6,9 +6,11 @@ from encryption.master_key_manager import MasterKeyManager
 from click import secho
 
 class CryptoHandler:
-    def __init__(self, password: bytes, config_path: str = "config/settings.json") -> None:
+    def __init__(self, password: bytes, config_path: str = "config/settings.json",
+                 master_key: Optional[bytes] = None) -> None:
         self.key_manager = MasterKeyManager(password, config_path=config_path)
-        self.master_key = self.key_manager.load_master_key()
+        # Argon2 derivation is the slowest step of unlocking, so accept an already loaded key
+        self.master_key = master_key if master_key is not None else self.key_manager.load_master_key()
         if not self.master_key:
             secho("\nFailed to load master key \n", fg="red")
             raise ValueError("Failed to load master key")
@@ -19,7 +21,7 @@ class CryptoHandler:
         ciphertext: bytes = aesgcm.encrypt(nonce, data, associated_data=None)
         return b64encode(nonce + ciphertext).decode()
     
-    def decrypt(self, encrypted_data: str) -> Optional[bytes]:
+    def decrypt(self, encrypted_data: str, quiet: bool = False) -> Optional[bytes]:
         try:
             encrypted_data: bytes = b64decode(encrypted_data)
             nonce: bytes = encrypted_data[:12]
@@ -28,5 +30,6 @@ class CryptoHandler:
             aesgcm: AESGCM = AESGCM(self.master_key)
             return aesgcm.decrypt(nonce, ciphertext, associated_data=None)
         except Exception as e:
-            secho(f"\nError decrypting data: {e} \n", fg="red")
+            if not quiet:
+                secho(f"\nError decrypting data: {e} \n", fg="red")
             return None
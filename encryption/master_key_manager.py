@@ -2,9 +2,10 @@ from base64 import b64encode, b64decode
 from os import urandom
 from typing import Optional, List
 from pathlib import Path
-from json import load
 from click import secho 
 
+from utils.settings import Settings, load_settings
+
 from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
@@ -17,14 +18,15 @@ class MasterKeyManager:
             secho(f"\nEncryption key directory does not exist: {self.encryption_key_dir} \n", fg="red")
             self.encryption_key_dir.mkdir(exist_ok=True)
 
-        with open(config_path, "r") as f:
-            self.config: dict = load(f)
+        # Parsed and validated once per process, shared by every key manager
+        self.settings: Settings = load_settings(config_path)
+        self.config: dict = self.settings.values
         
-        self.salt: bytes = b64decode(self.config["master_key_salt"])
-        self.argon2_time_cost: int = self.config["argon2_time_cost"]
-        self.argon2_memory_cost: int = self.config["argon2_memory_cost"]
-        self.argon2_parallelism: int = self.config["argon2_parallelism"]
-        self.argon2_length: int = self.config["argon2_length"]
+        self.salt: bytes = self.settings.salt
+        self.argon2_time_cost: int = self.settings.argon2_time_cost
+        self.argon2_memory_cost: int = self.settings.argon2_memory_cost
+        self.argon2_parallelism: int = self.settings.argon2_parallelism
+        self.argon2_length: int = self.settings.argon2_length
 
         self.master_key_file_pattern: str = master_key_file_pattern
 
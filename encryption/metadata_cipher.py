@@ -0,0 +1,35 @@
+from base64 import b64encode, b64decode
+from os import urandom
+from hmac import new as hmac_new
+from hashlib import sha256
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
+
+
+class MetadataCipher:
+    def __init__(self, master_key: bytes) -> None:
+        # Separate subkeys so the blind index never reuses the encryption key
+        self.encryption_key: bytes = self._derive(master_key, b"usb-backup-manager metadata encryption")
+        self.index_key: bytes = self._derive(master_key, b"usb-backup-manager metadata blind index")
+
+    @staticmethod
+    def _derive(master_key: bytes, info: bytes) -> bytes:
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info)
+        return hkdf.derive(master_key)
+
+    def encrypt(self, text: str) -> str:
+        aesgcm: AESGCM = AESGCM(self.encryption_key)
+        nonce: bytes = urandom(12)
+        ciphertext: bytes = aesgcm.encrypt(nonce, text.encode(), associated_data=None)
+        return b64encode(nonce + ciphertext).decode()
+
+    def decrypt(self, encrypted_text: str) -> str:
+        encrypted_data: bytes = b64decode(encrypted_text)
+        aesgcm: AESGCM = AESGCM(self.encryption_key)
+        return aesgcm.decrypt(encrypted_data[:12], encrypted_data[12:], associated_data=None).decode()
+
+    def blind_index(self, platform: str, account_name: str) -> str:
+        message: bytes = f"{platform}\x1f{account_name}".encode()
+        return hmac_new(self.index_key, message, sha256).hexdigest()
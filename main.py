@@ -1,5 +1,6 @@
 from encryption.crypto_handler import CryptoHandler
 from encryption.master_key_manager import MasterKeyManager
+from encryption.metadata_cipher import MetadataCipher
 from utils.input_handler import InputHandler
 from utils.db_utils import DbInit
 from utils.db_utils import DBUtils
@@ -29,7 +30,12 @@ def main():
         exit(1)
     
     # Initalize Master Key Manager
-    key_manager = MasterKeyManager(master_password)
+    try:
+        key_manager = MasterKeyManager(master_password)
+    except ValueError as e:
+        secho(f"\n{e} \n", fg="red", bold=True)
+        sys_exit(1)
+    settings = key_manager.settings
 
     # Confirm Password
     if not any(Path("keyvault").glob("master_key_*.enc")):
@@ -50,18 +56,43 @@ def main():
             secho("\nExiting... Wrong password or master key corrupted - Please try again \n", fg="red", bold=True, underline=True)
             sys_exit(1)
 
-    # Initialize Crypto Handler
-    crypto_handler = CryptoHandler(master_password)
+    # Initialize Crypto Handler, reusing the key unlocked above instead of deriving it again
+    crypto_handler = CryptoHandler(master_password, master_key=master_key)
 
     # Initialize DB
     db_dir = Path("db")
     db_init = DbInit(db_dir)
     db_init.initalize_all()
 
+    # Optionally keep platform and account names encrypted, looked up through a blind index
+    metadata_cipher = None
+    if settings.encrypted_metadata:
+        metadata_cipher = MetadataCipher(crypto_handler.master_key)
+    elif DBUtils(db_dir / "open_index.db").has_encrypted_metadata():
+        secho("Vault has encrypted account names - set encrypted_metadata to true in settings.json", fg="red")
+        sys_exit(1)
+
+    # Replay writes a crashed working copy session left in its journal, whatever the setting is now
+    db_init.recover_journal(metadata_cipher)
+
+    if metadata_cipher is not None:
+        migrated = DBUtils(db_dir / "open_index.db", metadata_cipher=metadata_cipher).encrypt_metadata("accounts")
+        migrated += DBUtils(db_dir / "used_index.db", metadata_cipher=metadata_cipher).encrypt_metadata("used_keys")
+        if migrated:
+            secho(f"Encrypted names for {migrated} existing row(s)", fg="green")
+
+    # Optionally work against an in-memory copy of the vault to spare the USB media
+    working_copy = None
+    if settings.working_copy:
+        working_copy = db_init.load_working_copy(
+            flush_interval=settings.working_copy_flush_interval,
+            flush_every=settings.working_copy_flush_every,
+            metadata_cipher=metadata_cipher)
+
     # Initialize database utilities
-    open_db = DBUtils(db_dir / "open_index.db")
-    encrypted_db = DBUtils(db_dir / "encrypted_index.db")
-    used_db = DBUtils(db_dir / "used_index.db")
+    open_db = DBUtils(db_dir / "open_index.db", working_copy, metadata_cipher)
+    encrypted_db = DBUtils(db_dir / "encrypted_index.db", working_copy, metadata_cipher)
+    used_db = DBUtils(db_dir / "used_index.db", working_copy, metadata_cipher)
 
     # Initialize Input Handler with required instances
     input_handler = InputHandler(key_manager, crypto_handler, open_db, encrypted_db, used_db)
@@ -72,8 +103,8 @@ def main():
 
         if command in ["-help", "add_account", "add_backup_key", "view_backup_key", 
                        "view_used_key", "delete_used_key", "all_accounts", 
-                       "all_backup_keys", "all_used_keys", "update_password", 
-                       "exit"]:
+                       "all_backup_keys", "all_used_keys", "account_summary", 
+                       "verify", "merge", "update_password", "exit"]:
             
             if command == "-help":
                 input_handler.help()
@@ -102,11 +133,25 @@ def main():
             if command == "all_used_keys":
                 input_handler.all_used_keys()
 
+            if command == "account_summary":
+                input_handler.account_summary()
+
+            if command == "verify":
+                input_handler.verify()
+
+            if command == "merge":
+                input_handler.merge()
+
             if command == "update_password":
                 input_handler.update_password()
 
             if command == "exit":
+                if working_copy is not None:
+                    working_copy.close()
                 sys_exit(0)
+
+            if working_copy is not None:
+                working_copy.maybe_flush()
         
         else:
             secho("Invalid command", fg="red")
@@ -0,0 +1,48 @@
+from pathlib import Path
+from sys import path as sys_path
+from typing import Callable
+
+import pytest
+
+sys_path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import utils.input_handler as input_handler
+from utils.db_utils import DbInit, DBUtils
+from utils.input_handler import InputHandler
+
+
+class FakeKeyManager:
+    def __init__(self, password: bytes) -> None:
+        pass
+
+    def load_master_key(self) -> bytes:
+        return b"key"
+
+
+class FakeCrypto:
+    # Identity "cipher" so tests can read and write backup keys as plain text
+    def encrypt(self, data: bytes) -> str:
+        return data.decode()
+
+    def decrypt(self, encrypted_data: str, quiet: bool = False) -> bytes:
+        return encrypted_data.encode()
+
+
+@pytest.fixture
+def make_handler(monkeypatch) -> Callable[[Path, list], InputHandler]:
+    """Build an InputHandler over a fresh vault that answers prompts from the given list."""
+    def make(db_dir: Path, answers: list) -> InputHandler:
+        DbInit(db_dir).initalize_all()
+        replies = iter(answers)
+        monkeypatch.setattr(input_handler, "prompt", lambda *args, **kwargs: next(replies))
+        monkeypatch.setattr(input_handler, "getpass", lambda *args, **kwargs: "password")
+        monkeypatch.setattr(input_handler, "MasterKeyManager", FakeKeyManager)
+        dbs = [DBUtils(db_dir / name) for name in ("open_index.db", "encrypted_index.db", "used_index.db")]
+        return InputHandler(FakeKeyManager(b""), FakeCrypto(), *dbs)
+
+    return make
+
+
+@pytest.fixture
+def fake_crypto() -> FakeCrypto:
+    return FakeCrypto()
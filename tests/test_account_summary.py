@@ -0,0 +1,101 @@
+from os import urandom
+from pathlib import Path
+from sqlite3 import connect
+
+import pytest
+
+from encryption.metadata_cipher import MetadataCipher
+from utils.db_utils import DbInit, DBUtils
+
+# platform, account, backup keys, (used key, used at)
+ACCOUNTS = [
+    ("github", "alice", ["gh-3"], [("gh-1", "2026-02-01 00:00:00"), ("gh-2", "2026-02-02 00:00:00")]),
+    ("aws", "bob", [], []),
+    ("slack", "carol", ["sl-2", "sl-3"], [("sl-1", "2026-01-01 00:00:00")]),
+]
+
+# Account ids in ascending order; no column has ties, so descending is the exact reverse
+ASCENDING_IDS = {
+    "platform": [2, 1, 3],
+    "account": [1, 2, 3],
+    "remaining": [2, 1, 3],
+    "used": [2, 3, 1],
+    "last_used": [2, 3, 1],
+}
+
+
+def build_vault(db_dir: Path, working_copy=None, metadata_cipher=None) -> list:
+    dbs = [DBUtils(db_dir / name, working_copy, metadata_cipher)
+           for name in ("open_index.db", "encrypted_index.db", "used_index.db")]
+    open_db, encrypted_db, used_db = dbs
+    for platform, account, keys, used in ACCOUNTS:
+        open_db.add_account(platform, account)
+        account_id = open_db.get_account_id(platform, account)
+        for key in keys:
+            encrypted_db.add_backup_key(account_id, key)
+        for used_key, _ in used:
+            used_db.archive_used_key(platform, account, used_key)
+
+    return dbs
+
+
+@pytest.fixture(params=[False, True], ids=["plain", "encrypted"])
+def vault(request, tmp_path: Path) -> list:
+    db_dir = tmp_path / "db"
+    DbInit(db_dir).initalize_all()
+    metadata_cipher = MetadataCipher(urandom(32)) if request.param else None
+    dbs = build_vault(db_dir, metadata_cipher=metadata_cipher)
+    with connect(db_dir / "used_index.db") as conn:
+        for _, _, _, used in ACCOUNTS:
+            conn.executemany("UPDATE used_keys SET used_at = ? WHERE used_key = ?",
+                             [(used_at, used_key) for used_key, used_at in used])
+
+    return dbs
+
+
+def summary(dbs: list, **kwargs) -> list:
+    open_db, encrypted_db, used_db = dbs
+    return open_db.get_account_summary(encrypted_db.db_path, used_db.db_path, **kwargs)
+
+
+def test_summary_rows(vault: list) -> None:
+    assert summary(vault) == [
+        ("aws", "bob", 2, 0, 0, None),
+        ("github", "alice", 1, 1, 2, "2026-02-02 00:00:00"),
+        ("slack", "carol", 3, 2, 1, "2026-01-01 00:00:00"),
+    ]
+
+
+@pytest.mark.parametrize("sort_by", list(DBUtils.SUMMARY_SORT_COLUMNS))
+@pytest.mark.parametrize("descending", [False, True], ids=["asc", "desc"])
+def test_summary_sort(vault: list, sort_by: str, descending: bool) -> None:
+    expected = ASCENDING_IDS[sort_by][::-1] if descending else ASCENDING_IDS[sort_by]
+
+    assert [row[2] for row in summary(vault, sort_by=sort_by, descending=descending)] == expected
+
+
+@pytest.mark.parametrize("max_remaining, expected", [(0, []), (1, [2]), (2, [2, 1]), (3, [2, 1, 3])])
+def test_summary_max_remaining_is_strict(vault: list, max_remaining: int, expected: list) -> None:
+    assert [row[2] for row in summary(vault, max_remaining=max_remaining)] == expected
+
+
+def test_summary_rejects_unknown_sort(vault: list) -> None:
+    with pytest.raises(ValueError):
+        summary(vault, sort_by="id")
+
+
+def test_summary_reads_unflushed_working_copy(tmp_path: Path) -> None:
+    db_dir = tmp_path / "db"
+    db_init = DbInit(db_dir)
+    db_init.initalize_all()
+    working_copy = db_init.load_working_copy(flush_interval=None, flush_every=None)
+    dbs = build_vault(db_dir, working_copy=working_copy)
+
+    # Nothing is on disk yet, so the counts can only come from the attached in-memory copies
+    assert summary([DBUtils(db.db_path) for db in dbs]) == []
+    assert [row[:5] for row in summary(dbs, sort_by="account")] == [
+        ("github", "alice", 1, 1, 2),
+        ("aws", "bob", 2, 0, 0),
+        ("slack", "carol", 3, 2, 1),
+    ]
+    working_copy.close()
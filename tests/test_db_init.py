@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from utils.db_utils import DbInit, DBUtils
+
+
+@pytest.mark.parametrize("missing", ["open_index.db", "encrypted_index.db", "used_index.db"])
+def test_missing_database_is_recreated_on_fast_path(tmp_path: Path, missing: str) -> None:
+    db_dir = tmp_path / "db"
+    DbInit(db_dir).initalize_all()
+    assert DbInit(db_dir).is_current()
+
+    (db_dir / missing).unlink()
+    db_init = DbInit(db_dir)
+    assert not db_init.is_current()
+    # The probe is read-only, so it must not leave an empty file behind
+    assert not (db_dir / missing).exists()
+
+    db_init.initalize_all()
+    assert db_init.is_current()
+    used_db = DBUtils(db_dir / "used_index.db")
+    used_db.archive_used_key("github", "alice", "code-1")
+    assert used_db.get_used_key("github", "alice") == ["code-1"]
@@ -0,0 +1,98 @@
+from os import urandom
+from pathlib import Path
+from sqlite3 import connect
+
+import pytest
+
+from encryption.metadata_cipher import MetadataCipher
+from utils.db_utils import DbInit, DBUtils
+from utils.integrity import IntegrityIndex
+from utils.vault_merge import VaultMerger
+
+
+def open_dbs(db_dir: Path, metadata_cipher=None) -> list:
+    DbInit(db_dir).initalize_all()
+    return [DBUtils(db_dir / name, metadata_cipher=metadata_cipher)
+            for name in ("open_index.db", "encrypted_index.db", "used_index.db")]
+
+
+@pytest.fixture
+def metadata_cipher() -> MetadataCipher:
+    return MetadataCipher(urandom(32))
+
+
+def test_lookups_go_through_blind_index(tmp_path: Path, metadata_cipher: MetadataCipher) -> None:
+    open_db, _, used_db = open_dbs(tmp_path / "db", metadata_cipher)
+    open_db.add_account("github", "alice")
+    used_db.archive_used_key("github", "alice", "code-1")
+    used_db.archive_used_key("github", "bob", "code-2")
+
+    with connect(open_db.db_path) as conn:
+        platform, lookup_hash = conn.execute("SELECT platform, lookup_hash FROM accounts").fetchone()
+    assert platform != "github"
+    assert lookup_hash == metadata_cipher.blind_index("github", "alice")
+
+    assert open_db.get_account_id("github", "alice") == 1
+    assert open_db.get_account_id("github", "bob") is None
+    assert used_db.get_used_key("github", "alice") == ["code-1"]
+
+    assert used_db.delete_used_key("github", "alice")
+    assert used_db.get_used_key("github", "alice") is None
+    assert used_db.get_used_key("github", "bob") == ["code-2"]
+
+
+def test_duplicate_account_is_rejected(tmp_path: Path, metadata_cipher: MetadataCipher) -> None:
+    open_db, _, _ = open_dbs(tmp_path / "db", metadata_cipher)
+
+    assert open_db.add_account("github", "alice")
+    # The ciphertexts differ, so only the unique blind index can catch this
+    assert not open_db.add_account("github", "alice")
+    assert open_db.add_account("github", "bob")
+
+
+def test_encrypt_metadata_resumes_partial_run(tmp_path: Path, metadata_cipher: MetadataCipher) -> None:
+    db_dir = tmp_path / "db"
+    open_db, _, used_db = open_dbs(db_dir)
+    names = [("github", "alice"), ("aws", "bob"), ("slack", "carol")]
+    for platform, account in names:
+        open_db.add_account(platform, account)
+        used_db.archive_used_key(platform, account, f"{account}-code")
+
+    # An interrupted run leaves its committed pages encrypted and the rest in plaintext
+    open_db, _, used_db = open_dbs(db_dir, metadata_cipher)
+    with connect(open_db.db_path) as conn:
+        conn.execute("UPDATE accounts SET platform = ?, account_name = ?, lookup_hash = ? WHERE id = 1",
+                     (metadata_cipher.encrypt("github"), metadata_cipher.encrypt("alice"),
+                      metadata_cipher.blind_index("github", "alice")))
+
+    assert open_db.encrypt_metadata("accounts", page_size=1) == 2
+    assert used_db.encrypt_metadata("used_keys", page_size=2) == 3
+    assert open_db.encrypt_metadata("accounts") == 0
+    assert not open_db.has_plaintext_metadata()
+
+    assert sorted(open_db.get_all_accounts()) == [("aws", "bob", 2), ("github", "alice", 1), ("slack", "carol", 3)]
+    for platform, account in names:
+        assert used_db.get_used_key(platform, account) == [f"{account}-code"]
+    assert IntegrityIndex(used_db.db_path, "used_keys").scan() == []
+
+
+def test_merge_matches_accounts_on_blind_index(tmp_path: Path, metadata_cipher: MetadataCipher,
+                                                fake_crypto) -> None:
+    target_open, target_encrypted, target_used = open_dbs(tmp_path / "db", metadata_cipher)
+    source_open, source_encrypted, source_used = open_dbs(tmp_path / "spare", metadata_cipher)
+    target_open.add_account("github", "alice")
+    source_open.add_account("slack", "carol")
+    source_open.add_account("github", "alice")
+    source_encrypted.add_backup_key(source_open.get_account_id("github", "alice"), "code-1")
+    source_used.archive_used_key("github", "alice", "code-0")
+
+    counts = VaultMerger(tmp_path / "db", tmp_path / "spare", fake_crypto).merge()
+
+    assert counts["new_accounts"] == 1
+    assert counts["add_keys"] == 1
+    assert sorted(target_open.get_all_accounts()) == [("github", "alice", 1), ("slack", "carol", 2)]
+    assert target_encrypted.get_backup_key(1)[0] == "code-1"
+    assert target_used.get_used_key("github", "alice") == ["code-0"]
+
+    # Re-merging finds nothing new, since the encrypted names are never compared directly
+    assert not any(VaultMerger(tmp_path / "db", tmp_path / "spare", fake_crypto).merge(dry_run=True).values())
@@ -0,0 +1,39 @@
+from pathlib import Path
+from sqlite3 import connect
+
+from utils.db_utils import DbInit, DBUtils
+from utils.integrity import IntegrityIndex
+
+
+def test_corrupted_lookup_hash_is_flagged(tmp_path: Path) -> None:
+    db_dir = tmp_path / "db"
+    DbInit(db_dir).initalize_all()
+    DBUtils(db_dir / "used_index.db").archive_used_key("github", "alice", "code-1")
+    integrity_index = IntegrityIndex(db_dir / "used_index.db", "used_keys")
+    assert integrity_index.scan() == []
+
+    with connect(db_dir / "used_index.db") as conn:
+        conn.execute("UPDATE used_keys SET lookup_hash = 'corrupted' WHERE id = 1")
+
+    assert integrity_index.scan() == [1]
+
+
+def test_upgrade_rebuilds_used_keys_tree(tmp_path: Path) -> None:
+    db_dir = tmp_path / "db"
+    DbInit(db_dir).initalize_all()
+    used_index_path = db_dir / "used_index.db"
+    DBUtils(used_index_path).archive_used_key("github", "alice", "code-1")
+
+    # Simulate a version 1 vault whose leaves were hashed without lookup_hash
+    with connect(used_index_path) as conn:
+        row = conn.execute("SELECT id, platform, account_name, used_key, used_at FROM used_keys").fetchone()
+        conn.execute("UPDATE used_keys_merkle SET hash = ? WHERE level = 0 AND position = 1",
+                     (IntegrityIndex.hash_row(row),))
+        conn.execute("PRAGMA user_version = 1")
+    integrity_index = IntegrityIndex(used_index_path, "used_keys")
+    assert integrity_index.scan() == [1]
+
+    DbInit(db_dir).initalize_all()
+
+    assert integrity_index.scan() == []
+    assert DbInit(db_dir).is_current()
@@ -0,0 +1,81 @@
+from pathlib import Path
+from sqlite3 import connect
+
+from utils.db_utils import DbInit, DBUtils
+
+
+def test_merge_rejects_directory_without_vault(tmp_path: Path, make_handler) -> None:
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    handler = make_handler(tmp_path / "db", [str(empty)])
+
+    handler.merge()
+
+    assert list(empty.iterdir()) == []
+
+
+def test_declining_upgrade_leaves_old_source_untouched(tmp_path: Path, make_handler) -> None:
+    source = tmp_path / "spare"
+    source.mkdir()
+    # A copy from before the integrity index and tombstones existed
+    with connect(source / "open_index.db") as conn:
+        conn.execute("CREATE TABLE accounts (id INTEGER PRIMARY KEY AUTOINCREMENT, platform TEXT NOT NULL, "
+                     "account_name TEXT NOT NULL, key_count INTEGER NOT NULL DEFAULT 0, "
+                     "UNIQUE(platform, account_name))")
+    with connect(source / "encrypted_index.db") as conn:
+        conn.execute("CREATE TABLE backup_keys (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "account_id INTEGER NOT NULL, encrypted_value TEXT NOT NULL)")
+    with connect(source / "used_index.db") as conn:
+        conn.execute("CREATE TABLE used_keys (id INTEGER PRIMARY KEY AUTOINCREMENT, platform TEXT NOT NULL, "
+                     "account_name TEXT NOT NULL, used_key TEXT NOT NULL, "
+                     "used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    before = {path.name: path.read_bytes() for path in source.iterdir()}
+
+    handler = make_handler(tmp_path / "db", [str(source), "n"])
+    handler.merge()
+
+    assert {path.name: path.read_bytes() for path in source.iterdir()} == before
+
+
+def test_confirmed_upgrade_then_merge(tmp_path: Path, make_handler) -> None:
+    source = tmp_path / "spare"
+    DbInit(source).initalize_all()
+    DBUtils(source / "open_index.db").add_account("github", "alice")
+    DBUtils(source / "encrypted_index.db").add_backup_key(1, "code-1")
+
+    handler = make_handler(tmp_path / "db", [str(source), "y"])
+    handler.merge()
+
+    assert handler.open_db.get_account_id("github", "alice") is not None
+    assert handler.encrypted_db.get_backup_key(1)[0] == "code-1"
+
+
+def test_key_viewed_before_tombstones_is_not_resurrected(tmp_path: Path, make_handler) -> None:
+    source = tmp_path / "spare"
+    DbInit(source).initalize_all()
+    DBUtils(source / "open_index.db").add_account("github", "alice")
+    DBUtils(source / "encrypted_index.db").add_backup_key(1, "code-1")
+
+    handler = make_handler(tmp_path / "db", [str(source), "y"])
+    handler.open_db.add_account("github", "alice")
+    # Viewed on the primary the old way: archived in plaintext but no tombstone
+    handler.used_db.archive_used_key("github", "alice", "code-1")
+    handler.merge()
+
+    assert handler.encrypted_db.get_backup_key(1) is None
+    assert handler.used_db.get_used_key("github", "alice") == ["code-1"]
+
+
+def test_key_viewed_on_source_before_tombstones_is_removed(tmp_path: Path, make_handler) -> None:
+    source = tmp_path / "spare"
+    DbInit(source).initalize_all()
+    DBUtils(source / "open_index.db").add_account("github", "alice")
+    DBUtils(source / "used_index.db").archive_used_key("github", "alice", "code-1")
+
+    handler = make_handler(tmp_path / "db", [str(source), "y"])
+    handler.open_db.add_account("github", "alice")
+    handler.encrypted_db.add_backup_key(1, "code-1")
+    handler.merge()
+
+    assert handler.encrypted_db.get_backup_key(1) is None
+    assert handler.used_db.get_used_key("github", "alice") == ["code-1"]
@@ -0,0 +1,23 @@
+from json import load
+from pathlib import Path
+
+import pytest
+
+from utils.settings import Settings
+
+with open(Path(__file__).resolve().parent.parent / "config" / "settings.json") as f:
+    VALUES = load(f)
+
+
+@pytest.mark.parametrize("key", ["working_copy_flush_interval", "working_copy_flush_every"])
+@pytest.mark.parametrize("value", [0, -1])
+def test_flush_settings_must_be_positive(key: str, value: int) -> None:
+    with pytest.raises(ValueError, match=f"{key} must be positive"):
+        Settings(dict(VALUES, **{key: value}))
+
+
+def test_flush_settings_accept_positive_and_default() -> None:
+    settings = Settings(dict(VALUES, working_copy_flush_interval=0.5, working_copy_flush_every=None))
+
+    assert settings.working_copy_flush_interval == 0.5
+    assert settings.working_copy_flush_every == 25
@@ -0,0 +1,51 @@
+from pathlib import Path
+from sqlite3 import connect
+
+from utils.db_utils import DbInit
+
+
+def test_reference_without_databases_is_reported(tmp_path: Path, make_handler, capsys) -> None:
+    reference = tmp_path / "reference"
+    reference.mkdir()
+
+    make_handler(tmp_path / "db", [str(reference)]).verify()
+
+    assert "not found" in capsys.readouterr().out
+    assert list(reference.iterdir()) == []
+
+
+def test_reference_without_integrity_index_is_reported(tmp_path: Path, make_handler, capsys) -> None:
+    reference = tmp_path / "reference"
+    reference.mkdir()
+    with connect(reference / "encrypted_index.db") as conn:
+        conn.execute("CREATE TABLE backup_keys (id INTEGER PRIMARY KEY, account_id INTEGER, encrypted_value TEXT)")
+    with connect(reference / "used_index.db") as conn:
+        conn.execute("CREATE TABLE used_keys (id INTEGER PRIMARY KEY, platform TEXT, account_name TEXT, "
+                     "used_key TEXT, used_at TIMESTAMP)")
+
+    make_handler(tmp_path / "db", [str(reference)]).verify()
+
+    assert "no integrity index" in capsys.readouterr().out
+
+
+def test_matching_reference_verifies(tmp_path: Path, make_handler, capsys) -> None:
+    reference = tmp_path / "reference"
+    DbInit(reference).initalize_all()
+
+    make_handler(tmp_path / "db", [str(reference)]).verify()
+
+    assert "Vault integrity verified" in capsys.readouterr().out
+
+
+def test_damaged_database_is_reported(tmp_path: Path, make_handler, capsys) -> None:
+    db_dir = tmp_path / "db"
+    handler = make_handler(db_dir, [""])
+    with open(db_dir / "encrypted_index.db", "r+b") as f:
+        f.write(bytes(16))
+
+    handler.verify()
+
+    out = capsys.readouterr().out
+    assert "backup_keys" in out and "corrupt or unreadable" in out
+    assert "used_keys: no corruption found" in out
+    assert "Vault integrity verified" not in out
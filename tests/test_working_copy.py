@@ -0,0 +1,108 @@
+from json import dumps
+from os import urandom
+from pathlib import Path
+
+import pytest
+
+from encryption.metadata_cipher import MetadataCipher
+from utils.db_utils import DbInit, DBUtils
+from utils.integrity import IntegrityIndex
+
+
+def open_vault(db_dir: Path, metadata_cipher=None):
+    db_init = DbInit(db_dir)
+    db_init.initalize_all()
+    working_copy = db_init.load_working_copy(flush_interval=None, flush_every=None,
+                                             metadata_cipher=metadata_cipher)
+    return working_copy, [DBUtils(db_dir / name, working_copy, metadata_cipher)
+                          for name in ("open_index.db", "encrypted_index.db", "used_index.db")]
+
+
+@pytest.mark.parametrize("sealed", [False, True], ids=["plain", "sealed"])
+def test_unflushed_consumed_key_is_replayed_after_crash(tmp_path: Path, sealed: bool) -> None:
+    metadata_cipher = MetadataCipher(urandom(32)) if sealed else None
+    db_dir = tmp_path / "db"
+
+    # The first session is abandoned without flushing, as if the process died
+    crashed, (open_db, encrypted_db, used_db) = open_vault(db_dir, metadata_cipher)
+    open_db.add_account("github", "alice")
+    account_id = open_db.get_account_id("github", "alice")
+    encrypted_db.add_backup_key(account_id, "code-1")
+    encrypted_db.add_backup_key(account_id, "code-2")
+    _, backup_key_id = encrypted_db.get_backup_key(account_id)
+    encrypted_db.delete_backup_key(account_id, backup_key_id)
+    used_db.archive_used_key("github", "alice", "code-1")
+
+    journal = (db_dir / "working_copy.journal").read_text()
+    assert ("alice" in journal) is not sealed
+
+    working_copy, (open_db, encrypted_db, used_db) = open_vault(db_dir, metadata_cipher)
+    assert encrypted_db.get_backup_key(account_id)[0] == "code-2"
+    assert used_db.get_used_key("github", "alice") == ["code-1"]
+    assert (db_dir / "working_copy.journal").read_text() == ""
+    working_copy.close()
+
+    # Replay is exactly once: reopening again changes nothing
+    working_copy, (open_db, encrypted_db, used_db) = open_vault(db_dir, metadata_cipher)
+    assert used_db.get_used_key("github", "alice") == ["code-1"]
+    working_copy.close()
+    crashed.connections.clear()
+
+
+def test_failed_write_is_not_left_in_journal(tmp_path: Path, monkeypatch) -> None:
+    db_dir = tmp_path / "db"
+    working_copy, (open_db, encrypted_db, used_db) = open_vault(db_dir)
+    open_db.add_account("github", "alice")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(IntegrityIndex, "update_row", fail)
+    with pytest.raises(RuntimeError):
+        encrypted_db.add_backup_key(1, "code-1")
+    monkeypatch.undo()
+
+    assert "add_backup_key" not in (db_dir / "working_copy.journal").read_text()
+    encrypted_db.add_backup_key(1, "code-2")
+
+    # Reopening without a flush replays only the writes that succeeded
+    reopened, (open_db, encrypted_db, used_db) = open_vault(db_dir)
+    assert encrypted_db.get_backup_key(1)[0] == "code-2"
+    assert open_db.get_account_id("github", "alice") == 1
+    reopened.close()
+    working_copy.connections.clear()
+
+
+def test_unreplayable_entry_does_not_block_unlock(tmp_path: Path) -> None:
+    db_dir = tmp_path / "db"
+    crashed, (open_db, encrypted_db, used_db) = open_vault(db_dir)
+    open_db.add_account("github", "alice")
+    with open(db_dir / "working_copy.journal", "a") as f:
+        f.write(dumps({"seq": crashed.seq + 1, "db": str(db_dir / "open_index.db"),
+                       "op": "add_account", "args": []}) + "\n")
+
+    working_copy, (open_db, encrypted_db, used_db) = open_vault(db_dir)
+    assert open_db.get_account_id("github", "alice") == 1
+    assert (db_dir / "working_copy.journal").read_text() == ""
+    working_copy.close()
+    crashed.connections.clear()
+
+
+def test_journal_is_recovered_with_working_copy_disabled(tmp_path: Path) -> None:
+    db_dir = tmp_path / "db"
+    crashed, (open_db, encrypted_db, used_db) = open_vault(db_dir)
+    open_db.add_account("github", "alice")
+    encrypted_db.add_backup_key(1, "code-1")
+    encrypted_db.add_backup_key(1, "code-2")
+    encrypted_db.delete_backup_key(1, 1)
+
+    # The next unlock runs straight against the files
+    DbInit(db_dir).recover_journal()
+    assert DBUtils(db_dir / "encrypted_index.db").get_backup_key(1) == ("code-2", 2)
+    assert (db_dir / "working_copy.journal").read_text() == ""
+
+    # Turning the working copy back on later does not replay the old entries again
+    working_copy, (open_db, encrypted_db, used_db) = open_vault(db_dir)
+    assert encrypted_db.get_backup_key(1) == ("code-2", 2)
+    working_copy.close()
+    crashed.connections.clear()
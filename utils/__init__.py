@@ -1,8 +1,25 @@
 """
 This module contains the utility functions for the application.
+Exports are resolved lazily so importing one submodule does not load the rest.
 """
 
-from .input_handler import InputHandler
-from .db_utils import DbInit, DBUtils
+from importlib import import_module
 
-__all__ = ["InputHandler", "DbInit", "DBUtils"]
+_EXPORTS = {
+    "InputHandler": ".input_handler",
+    "DbInit": ".db_utils",
+    "DBUtils": ".db_utils",
+    "IntegrityIndex": ".integrity",
+    "VaultMerger": ".vault_merge",
+    "WorkingCopy": ".working_copy",
+    "Settings": ".settings",
+    "load_settings": ".settings",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_EXPORTS[name], __name__), name)
@@ -1,10 +1,43 @@
-from sqlite3 import connect, Cursor
+from sqlite3 import connect, Cursor, Connection, Error as SqliteError
 from pathlib import Path
-from typing import Optional, Union, List
+from functools import wraps
+from contextlib import closing
+from typing import Optional, Union, List, Callable, TYPE_CHECKING
 from click import secho 
 
+from utils.integrity import IntegrityIndex
+from utils.vault_merge import consumed_key_hash
+from utils.working_copy import WorkingCopy
+
+if TYPE_CHECKING:
+    from encryption.metadata_cipher import MetadataCipher
+
+
+def journaled(method: Callable) -> Callable:
+    # Writes against a working copy are journaled first and counted towards the next flush
+    @wraps(method)
+    def wrapper(self: "DBUtils", *args):
+        offset = None
+        if self.working_copy is not None:
+            offset = self.working_copy.log(self.db_path, method.__name__, args)
+        try:
+            result = method(self, *args)
+        except Exception:
+            # A write that failed in memory must not be replayed at the next unlock
+            if offset is not None:
+                self.working_copy.discard(offset)
+            raise
+        if self.working_copy is not None:
+            self.working_copy.record_write()
+        return result
+
+    return wrapper
+
 
 class DbInit:
+    # Bump when initalize_all gains a new upgrade step so existing vaults run it once
+    SCHEMA_VERSION: int = 2
+
     def __init__(self, db_dir: Union[str, Path]) -> None:
         self.db_dir = db_dir
         self.db_dir.mkdir(exist_ok=True)
@@ -16,7 +49,23 @@ class DbInit:
         return None
 
 
+    def is_current(self) -> bool:
+        # One read-only connection checks all three files; mode=ro fails if any of them is missing
+        try:
+            with closing(connect(f"{self.open_index_path.resolve().as_uri()}?mode=ro", uri=True)) as conn:
+                conn.execute("ATTACH DATABASE ? AS enc_index",
+                             (f"{self.encrypted_index_path.resolve().as_uri()}?mode=ro",))
+                conn.execute("ATTACH DATABASE ? AS used_index",
+                             (f"{self.used_index_path.resolve().as_uri()}?mode=ro",))
+                return all(conn.execute(f"PRAGMA {schema}.user_version").fetchone()[0] >= self.SCHEMA_VERSION
+                           for schema in ("main", "enc_index", "used_index"))
+        except SqliteError:
+            return False
+
     def initalize_all(self) -> None:
+        if self.is_current():
+            return None
+
         if self.open_index_path.exists():
             secho(f"Open index already exists: {self.open_index_path}", fg="yellow")
         else:
@@ -32,6 +81,121 @@ class DbInit:
         else:
             self._create_used_index()
 
+        self._create_blind_indexes()
+        self._create_lookup_indexes()
+        self._create_integrity_indexes()
+        self._upgrade_integrity_indexes()
+        self._create_consumed_keys()
+
+        # Stamped last, so an interrupted upgrade is simply retried on the next launch
+        for db_path in (self.open_index_path, self.encrypted_index_path, self.used_index_path):
+            with closing(connect(db_path)) as conn:
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                conn.commit()
+
+        return None
+
+    def load_working_copy(self, flush_interval: Optional[float] = 60.0, flush_every: Optional[int] = 25,
+                          metadata_cipher: Optional["MetadataCipher"] = None) -> WorkingCopy:
+        working_copy = self._load_working_copy(flush_interval, flush_every, metadata_cipher)
+        secho("Vault loaded into memory; changes are written back in batches", fg="yellow")
+
+        return working_copy
+
+    def recover_journal(self, metadata_cipher: Optional["MetadataCipher"] = None) -> None:
+        # Unflushed writes from a crashed session must land even if the working copy was turned off since
+        journal_path: Path = self.db_dir / "working_copy.journal"
+        if not journal_path.exists() or journal_path.stat().st_size == 0:
+            return None
+
+        working_copy = self._load_working_copy(None, None, metadata_cipher)
+        working_copy.flush(force=True)
+        working_copy.close()
+
+        return None
+
+    def _load_working_copy(self, flush_interval: Optional[float], flush_every: Optional[int],
+                           metadata_cipher: Optional["MetadataCipher"]) -> WorkingCopy:
+        working_copy = WorkingCopy(
+            [self.open_index_path, self.encrypted_index_path, self.used_index_path],
+            self.db_dir / "working_copy.journal", flush_interval=flush_interval, flush_every=flush_every,
+            metadata_cipher=metadata_cipher)
+        working_copy.load(lambda db_path, op, args: getattr(
+            DBUtils(db_path, working_copy, metadata_cipher), op)(*args))
+
+        return working_copy
+
+    def _create_consumed_keys(self) -> None:
+        # Tombstones for viewed keys so merging another copy never resurrects them
+        with connect(self.encrypted_index_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS consumed_keys (
+                    value_hash TEXT PRIMARY KEY)
+            """)
+            conn.commit()
+
+        return None
+
+    def _upgrade_integrity_indexes(self) -> None:
+        # Version 2 added lookup_hash to the used_keys leaf hash, so older trees are rebuilt once
+        with closing(connect(self.used_index_path)) as conn:
+            version: int = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 2:
+            IntegrityIndex(self.used_index_path, "used_keys").rebuild()
+
+        return None
+
+    def _create_integrity_indexes(self) -> None:
+        for db_path, table in ((self.encrypted_index_path, "backup_keys"), (self.used_index_path, "used_keys")):
+            integrity_index = IntegrityIndex(db_path, table)
+            if integrity_index.create():
+                # Existing vaults get their tree built once from the current rows
+                integrity_index.rebuild()
+                secho(f"Integrity index created: {db_path}", fg="green")
+
+        return None
+
+    def _create_blind_indexes(self) -> None:
+        # Vaults created before encrypted metadata lack the lookup_hash column
+        for db_path, table in ((self.open_index_path, "accounts"), (self.used_index_path, "used_keys")):
+            with connect(db_path) as conn:
+                columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+                if "lookup_hash" not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN lookup_hash TEXT")
+                conn.commit()
+
+        with connect(self.open_index_path) as conn:
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_lookup 
+                ON accounts (lookup_hash)
+            """)
+            conn.commit()
+
+        with connect(self.used_index_path) as conn:
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_used_keys_lookup 
+                ON used_keys (lookup_hash, used_at)
+            """)
+            conn.commit()
+
+        return None
+
+    def _create_lookup_indexes(self) -> None:
+        # Indexes backing the per-account aggregates; safe to re-run on existing vaults
+        with connect(self.encrypted_index_path) as conn:
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_backup_keys_account 
+                ON backup_keys (account_id)
+            """)
+            conn.commit()
+
+        with connect(self.used_index_path) as conn:
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_used_keys_account 
+                ON used_keys (platform, account_name, used_at)
+            """)
+            conn.commit()
+
         return None
 
     def _create_open_index(self) -> None:
@@ -47,6 +211,7 @@ class DbInit:
                     platform TEXT NOT NULL,
                     account_name TEXT NOT NULL,
                     key_count INTEGER NOT NULL DEFAULT 0,
+                    lookup_hash TEXT,
                     UNIQUE(platform, account_name))
             """)
             conn.commit()
@@ -86,7 +251,8 @@ class DbInit:
                     platform TEXT NOT NULL,
                     account_name TEXT NOT NULL,
                     used_key TEXT NOT NULL,
-                    used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+                    used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    lookup_hash TEXT);
             """)
             conn.commit()
             secho(f"Used index created: {self.used_index_path}", fg="green")
@@ -95,18 +261,57 @@ class DbInit:
     
 
 class DBUtils:
-    def __init__(self, db_path: Union[str, Path]) -> None:
+    SUMMARY_SORT_COLUMNS = {
+        "platform": "a.platform, a.account_name",
+        "account": "a.account_name, a.platform",
+        "remaining": "remaining",
+        "used": "used",
+        "last_used": "last_used",
+    }
+
+    def __init__(self, db_path: Union[str, Path], working_copy: Optional[WorkingCopy] = None,
+                 metadata_cipher: Optional["MetadataCipher"] = None) -> None:
         self.db_path = db_path
+        self.working_copy: Optional[WorkingCopy] = working_copy
+        self.metadata_cipher: Optional["MetadataCipher"] = metadata_cipher
+
+    def _connect(self) -> Connection:
+        if self.working_copy is not None:
+            return self.working_copy.connect(self.db_path)
+        return connect(self.db_path)
+
+    def _attach_target(self, db_path: Union[str, Path]) -> str:
+        if self.working_copy is not None:
+            return self.working_copy.uri(db_path)
+        return str(db_path)
+
+    def _account_values(self, platform: str, account_name: str) -> tuple[str, str, Optional[str]]:
+        if self.metadata_cipher is None:
+            return platform, account_name, None
+        return (self.metadata_cipher.encrypt(platform), self.metadata_cipher.encrypt(account_name),
+                self.metadata_cipher.blind_index(platform, account_name))
+
+    def _account_filter(self, platform: str, account_name: str) -> tuple[str, tuple]:
+        # Encrypted names are random per row, so equality lookups go through the blind index
+        if self.metadata_cipher is None:
+            return "platform = ? AND account_name = ?", (platform, account_name)
+        return "lookup_hash = ?", (self.metadata_cipher.blind_index(platform, account_name),)
+
+    def _reveal(self, row: tuple) -> tuple:
+        if self.metadata_cipher is None:
+            return row
+        return (self.metadata_cipher.decrypt(row[0]), self.metadata_cipher.decrypt(row[1])) + tuple(row[2:])
 
+    @journaled
     def add_account(self, platform: Optional[str], account_name: Optional[str]) -> bool:
         try:
-            with connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor: Cursor = conn.cursor()
                 cursor.execute("""
                     INSERT INTO accounts 
-                    (platform, account_name) 
-                    VALUES (?, ?)
-                """, (platform, account_name))
+                    (platform, account_name, lookup_hash) 
+                    VALUES (?, ?, ?)
+                """, self._account_values(platform, account_name))
                 conn.commit()
             return True
         except Exception as e:
@@ -114,29 +319,32 @@ class DBUtils:
                 return False
             raise e
 
+    @journaled
     def add_backup_key(self, account_id: str, encrypted_value: str) -> None:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO backup_keys 
                 (account_id, encrypted_value) 
                 VALUES (?, ?)
             """, (account_id, encrypted_value))
+            IntegrityIndex(self.db_path, "backup_keys").update_row(cursor, cursor.lastrowid)
             conn.commit()
 
     def get_account_id(self, platform: str, account_name: str) -> Optional[str]:
-        with connect(self.db_path) as conn:
+        condition, params = self._account_filter(platform, account_name)
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT id 
                 FROM accounts 
-                WHERE platform = ? AND account_name = ?
-            """, (platform, account_name))
+                WHERE {condition}
+            """, params)
             result = cursor.fetchone()
             return result[0] if result else None
 
     def get_backup_key(self, account_id: str) -> Optional[tuple[str, str]]:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 SELECT encrypted_value, id 
@@ -149,51 +357,115 @@ class DBUtils:
             return result if result else None
         
     def get_used_key(self, platform: str, account_name: str) -> Optional[List[str]]:
-        with connect(self.db_path) as conn:
+        condition, params = self._account_filter(platform, account_name)
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT used_key 
                 FROM used_keys 
-                WHERE platform = ? AND account_name = ? 
+                WHERE {condition} 
                 ORDER BY id ASC
-            """, (platform, account_name))
+            """, params)
             result = cursor.fetchall()
             return [row[0] for row in result] if result else None
         
+    @journaled
     def archive_used_key(self, platform: str, account_name: str, used_key: str) -> None:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
+            encrypted_platform, encrypted_account, lookup_hash = self._account_values(platform, account_name)
             cursor.execute("""
                 INSERT INTO used_keys 
-                (platform, account_name, used_key) 
-                VALUES (?, ?, ?)
-            """, (platform, account_name, used_key))
+                (platform, account_name, used_key, lookup_hash) 
+                VALUES (?, ?, ?, ?)
+            """, (encrypted_platform, encrypted_account, used_key, lookup_hash))
+            IntegrityIndex(self.db_path, "used_keys").update_row(cursor, cursor.lastrowid)
             conn.commit()
 
         return None
 
     def get_all_used_keys(self) -> list[tuple[str, str, str]]:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 SELECT platform,
                 account_name, 
                 used_key FROM used_keys
             """)
-            return cursor.fetchall()
+            return [self._reveal(row) for row in cursor.fetchall()]
         
     def get_all_accounts(self) -> list[tuple[str, str, str]]:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 SELECT platform,
                 account_name,
                 id FROM accounts
             """)
-            return cursor.fetchall()
+            return [self._reveal(row) for row in cursor.fetchall()]
         
+    def get_account_summary(self, encrypted_db_path: Union[str, Path], used_db_path: Union[str, Path],
+                            max_remaining: Optional[int] = None, sort_by: str = "platform",
+                            descending: bool = False) -> list[tuple[str, str, int, int, int, Optional[str]]]:
+        if sort_by not in self.SUMMARY_SORT_COLUMNS:
+            raise ValueError(f"Invalid sort column: {sort_by}")
+
+        # Ciphertext order is meaningless, so name sorts happen after decryption
+        sort_after_reveal: bool = self.metadata_cipher is not None and sort_by in ("platform", "account")
+        order: str = "a.id" if sort_after_reveal else self.SUMMARY_SORT_COLUMNS[sort_by]
+        if descending and not sort_after_reveal:
+            order = ", ".join(f"{column} DESC" for column in order.split(", "))
+
+        if self.metadata_cipher is None:
+            used_group, used_join = "platform, account_name", "u.platform = a.platform AND u.account_name = a.account_name"
+        else:
+            used_group, used_join = "lookup_hash", "u.lookup_hash = a.lookup_hash"
+
+        where: str = ""
+        params: tuple = ()
+        if max_remaining is not None:
+            where = "WHERE remaining < ?"
+            params = (max_remaining,)
+
+        with self._connect() as conn:
+            cursor: Cursor = conn.cursor()
+            cursor.execute("ATTACH DATABASE ? AS enc_index", (self._attach_target(encrypted_db_path),))
+            cursor.execute("ATTACH DATABASE ? AS used_index", (self._attach_target(used_db_path),))
+            cursor.execute(f"""
+                SELECT platform, account_name, id, remaining, used, last_used FROM (
+                    SELECT a.platform, 
+                    a.account_name, 
+                    a.id,
+                    COALESCE(b.remaining, 0) AS remaining,
+                    COALESCE(u.used, 0) AS used,
+                    u.last_used
+                    FROM accounts a
+                    LEFT JOIN (
+                        SELECT account_id, COUNT(*) AS remaining 
+                        FROM enc_index.backup_keys 
+                        GROUP BY account_id
+                    ) b ON b.account_id = a.id
+                    LEFT JOIN (
+                        SELECT {used_group}, COUNT(*) AS used, MAX(used_at) AS last_used 
+                        FROM used_index.used_keys 
+                        GROUP BY {used_group}
+                    ) u ON {used_join}
+                ) a
+                {where}
+                ORDER BY {order}
+            """, params)
+            result = [self._reveal(row) for row in cursor.fetchall()]
+            cursor.execute("DETACH DATABASE enc_index")
+            cursor.execute("DETACH DATABASE used_index")
+
+        if sort_after_reveal:
+            name_order = (0, 1) if sort_by == "platform" else (1, 0)
+            result.sort(key=lambda row: (row[name_order[0]], row[name_order[1]]), reverse=descending)
+
+        return result
+
     def get_all_backup_keys(self) -> list[tuple[str, str]]:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 SELECT account_id, encrypted_value
@@ -201,8 +473,65 @@ class DBUtils:
             """)
             return cursor.fetchall()
         
+    def has_encrypted_metadata(self, table: str = "accounts") -> bool:
+        with self._connect() as conn:
+            cursor: Cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT 1 
+                FROM {table} 
+                WHERE lookup_hash IS NOT NULL 
+                LIMIT 1
+            """)
+            return cursor.fetchone() is not None
+
+    def has_plaintext_metadata(self, table: str = "accounts") -> bool:
+        with self._connect() as conn:
+            cursor: Cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT 1 
+                FROM {table} 
+                WHERE lookup_hash IS NULL 
+                LIMIT 1
+            """)
+            return cursor.fetchone() is not None
+
+    def encrypt_metadata(self, table: str, page_size: int = 500) -> int:
+        """Encrypt plaintext names in place, one committed page at a time so an interrupted run resumes."""
+        if self.metadata_cipher is None:
+            raise ValueError("Encrypting metadata requires a metadata cipher")
+
+        integrity_index = IntegrityIndex(self.db_path, table) if table == "used_keys" else None
+        migrated: int = 0
+        with self._connect() as conn:
+            cursor: Cursor = conn.cursor()
+            while True:
+                cursor.execute(f"""
+                    SELECT id, platform, account_name 
+                    FROM {table} 
+                    WHERE lookup_hash IS NULL 
+                    ORDER BY id ASC 
+                    LIMIT ?
+                """, (page_size,))
+                batch = cursor.fetchall()
+                if not batch:
+                    break
+
+                for row_id, platform, account_name in batch:
+                    cursor.execute(f"""
+                        UPDATE {table} 
+                        SET platform = ?, account_name = ?, lookup_hash = ? 
+                        WHERE id = ?
+                    """, self._account_values(platform, account_name) + (row_id,))
+                    if integrity_index is not None:
+                        integrity_index.update_row(cursor, row_id)
+                conn.commit()
+                migrated += len(batch)
+
+        return migrated
+
+    @journaled
     def delete_account(self, account_id: str) -> None:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 DELETE FROM accounts 
@@ -212,30 +541,55 @@ class DBUtils:
 
         return None
 
+    @journaled
     def delete_backup_key(self, account_id: str, backup_key_id: str) -> Optional[bool]:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
+            cursor.execute("""
+                SELECT encrypted_value 
+                FROM backup_keys 
+                WHERE account_id = ? AND id = ?
+            """, (account_id, backup_key_id))
+            result = cursor.fetchone()
+            if result:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO consumed_keys 
+                    (value_hash) 
+                    VALUES (?)
+                """, (consumed_key_hash(result[0]),))
             cursor.execute("""
                 DELETE FROM backup_keys 
                 WHERE account_id = ? AND id = ?
             """, (account_id, backup_key_id))
+            IntegrityIndex(self.db_path, "backup_keys").update_row(cursor, backup_key_id)
             conn.commit()
 
         return True
     
+    @journaled
     def delete_used_key(self, platform: str, account_name: str) -> Optional[bool]:
-        with connect(self.db_path) as conn:
+        condition, params = self._account_filter(platform, account_name)
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
-            cursor.execute("""
+            cursor.execute(f"""
+                SELECT id 
+                FROM used_keys 
+                WHERE {condition}
+            """, params)
+            used_key_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"""
                 DELETE FROM used_keys 
-                WHERE platform = ? AND account_name = ?
-            """, (platform, account_name))
+                WHERE {condition}
+            """, params)
+            integrity_index = IntegrityIndex(self.db_path, "used_keys")
+            for used_key_id in used_key_ids:
+                integrity_index.update_row(cursor, used_key_id)
             conn.commit()
 
         return True
     
     def get_key_count(self, account_id: str) -> int:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 SELECT key_count 
@@ -245,8 +599,9 @@ class DBUtils:
             result = cursor.fetchone()
             return result[0] if result else 0
 
+    @journaled
     def increment_key_count(self, account_id: str) -> None:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 UPDATE accounts 
@@ -257,8 +612,9 @@ class DBUtils:
 
         return None
 
+    @journaled
     def decrement_key_count(self, account_id: str) -> None:
-        with connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor: Cursor = conn.cursor()
             cursor.execute("""
                 UPDATE accounts 
@@ -1,10 +1,13 @@
 from getpass import getpass
+from sqlite3 import Error as SqliteError
 from click import prompt, secho
 
 from encryption.master_key_manager import MasterKeyManager
 from encryption.crypto_handler import CryptoHandler
 
-from utils.db_utils import DBUtils
+from utils.db_utils import DbInit, DBUtils
+from utils.integrity import IntegrityIndex
+from utils.vault_merge import VaultMerger
 
 from pathlib import Path
 
@@ -29,8 +32,11 @@ class InputHandler:
         secho("6. All Accounts: all_accounts", fg="blue")
         secho("7. All Backup Keys: all_backup_keys", fg="blue")
         secho("8. All Used Keys: all_used_keys", fg="blue")
-        secho("9. Update Password: update_password", fg="blue")
-        secho("10. Exit: exit", fg="blue")
+        secho("9. Account Summary: account_summary", fg="blue")
+        secho("10. Verify Integrity: verify", fg="blue")
+        secho("11. Merge Vault: merge", fg="blue")
+        secho("12. Update Password: update_password", fg="blue")
+        secho("13. Exit: exit", fg="blue")
 
     def add_account(self) -> None:
         secho("platform: ", fg="yellow", nl=False)
@@ -166,6 +172,179 @@ class InputHandler:
         for account in accounts:
             secho(f"Platform: {account[0]}, Account: {account[1]}, ID: {account[2]}", fg="green")
 
+    def account_summary(self) -> None:
+        sort_options = list(DBUtils.SUMMARY_SORT_COLUMNS)
+        secho(f"sort by ({', '.join(sort_options)}): ", fg="yellow", nl=False)
+        sort_by = prompt("", default="platform", show_default=False).strip().lower()
+        if sort_by not in sort_options:
+            secho("Invalid sort option", fg="red")
+            return
+
+        secho("descending? (y/n): ", fg="yellow", nl=False)
+        descending = prompt("", default="n", show_default=False).strip().lower() == "y"
+
+        secho("only accounts with fewer than N codes left (blank for all): ", fg="yellow", nl=False)
+        max_remaining = prompt("", default="", show_default=False).strip()
+        if max_remaining and not max_remaining.isdigit():
+            secho("Please enter a whole number", fg="red")
+            return
+
+        summary = self.open_db.get_account_summary(
+            self.encrypted_db.db_path, self.used_db.db_path,
+            max_remaining=int(max_remaining) if max_remaining else None,
+            sort_by=sort_by, descending=descending)
+
+        if not summary:
+            secho("No accounts found", fg="yellow")
+            return
+
+        for platform, account, account_id, remaining, used, last_used in summary:
+            color = "red" if remaining == 0 else "green"
+            secho(f"Platform: {platform}, Account: {account}, ID: {account_id}, "
+                  f"Remaining: {remaining}, Used: {used}, Last Used: {last_used or 'never'}", fg=color)
+
+    def verify(self) -> None:
+        secho("reference vault db directory (blank to self-check): ", fg="yellow", nl=False)
+        reference = prompt("", default="", show_default=False).strip()
+        if reference:
+            reference_indexes = {
+                table: IntegrityIndex(Path(reference) / Path(db.db_path).name, table, read_only=True)
+                for db, table in ((self.encrypted_db, "backup_keys"), (self.used_db, "used_keys"))
+            }
+            for reference_index in reference_indexes.values():
+                if not Path(reference_index.db_path).is_file():
+                    secho(f"Reference vault database not found: {reference_index.db_path}", fg="red")
+                    return
+                try:
+                    has_index = reference_index.exists()
+                except SqliteError:
+                    secho(f"Reference database is not readable: {reference_index.db_path}", fg="red")
+                    return
+                if not has_index:
+                    secho(f"Reference copy has no integrity index: {reference_index.db_path} - "
+                          "open it once with this version first", fg="red")
+                    return
+
+        # Integrity checks read the files, so write back any pending changes first
+        if self.open_db.working_copy is not None:
+            self.open_db.working_copy.flush()
+
+        intact = True
+        for db, table in ((self.encrypted_db, "backup_keys"), (self.used_db, "used_keys")):
+            integrity_index = IntegrityIndex(db.db_path, table)
+
+            try:
+                if reference:
+                    reference_index = reference_indexes[table]
+                    if integrity_index.root() == reference_index.root():
+                        secho(f"{table}: roots match", fg="green")
+                        continue
+                    flagged = integrity_index.diff(reference_index)
+                else:
+                    flagged = integrity_index.scan()
+            except SqliteError as e:
+                # Damaged media is what verify exists to diagnose, so report it instead of crashing
+                intact = False
+                secho(f"{table}: {db.db_path} is corrupt or unreadable ({e})", fg="red")
+                continue
+
+            if not flagged:
+                secho(f"{table}: no corruption found", fg="green")
+                continue
+
+            intact = False
+            secho(f"{table}: {len(flagged)} row(s) flagged", fg="red")
+            for row_id, row in zip(flagged, integrity_index.flagged_rows(flagged)):
+                if row is None:
+                    secho(f"  ID: {row_id} missing from this copy", fg="red")
+                elif table == "backup_keys" and self.crypto_handler.decrypt(row[2], quiet=True) is None:
+                    secho(f"  ID: {row_id} fails decryption", fg="red")
+                else:
+                    secho(f"  ID: {row_id} differs but is readable", fg="yellow")
+
+        if intact:
+            secho("Vault integrity verified", fg="green", bold=True)
+
+    def merge(self) -> None:
+        secho("source vault db directory: ", fg="yellow", nl=False)
+        source = prompt("").strip()
+        secho("password: ", fg="yellow", nl=False)
+        password = getpass("").encode()
+
+        temp_key_manager = MasterKeyManager(password)
+        if temp_key_manager.load_master_key() is None:
+            secho("Incorrect password", fg="red")
+            return
+
+        target_dir = Path(self.open_db.db_path).parent
+        source_dir = Path(source)
+        if not source_dir.is_dir() or source_dir.resolve() == target_dir.resolve():
+            secho("Source must be a different vault db directory", fg="red")
+            return
+
+        try:
+            merger = VaultMerger(target_dir, source_dir, self.crypto_handler)
+            sample_key = merger.sample_source_key()
+        except FileNotFoundError as e:
+            secho(str(e), fg="red")
+            return
+        except SqliteError:
+            secho("Source directory does not contain a readable vault", fg="red")
+            return
+
+        if sample_key is not None and self.crypto_handler.decrypt(sample_key, quiet=True) is None:
+            secho("Source vault was encrypted with a different master key", fg="red")
+            return
+
+        # Both copies must be on the current schema and store account names the same way
+        metadata_cipher = self.open_db.metadata_cipher
+        source_init = DbInit(source_dir)
+        needs_upgrade = not source_init.is_current()
+        source_open = DBUtils(source_dir / "open_index.db", metadata_cipher=metadata_cipher)
+        source_used = DBUtils(source_dir / "used_index.db", metadata_cipher=metadata_cipher)
+        if metadata_cipher is None:
+            if not needs_upgrade and source_open.has_encrypted_metadata():
+                secho("Source vault has encrypted account names - enable encrypted_metadata first", fg="red")
+                return
+            needs_encryption = False
+        else:
+            needs_encryption = needs_upgrade or source_open.has_plaintext_metadata() \
+                or source_used.has_plaintext_metadata("used_keys")
+
+        if needs_upgrade or needs_encryption:
+            secho("The source vault must be upgraded before merging; this changes the source copy.", fg="yellow")
+            if needs_encryption:
+                secho("Its account names will be encrypted, so it must then be opened with "
+                      "encrypted_metadata enabled.", fg="yellow")
+            secho("upgrade source? (y/n): ", fg="yellow", nl=False)
+            if prompt("").strip().lower() != "y":
+                secho("Merge cancelled", fg="yellow")
+                return
+            source_init.initalize_all()
+            if needs_encryption:
+                source_open.encrypt_metadata("accounts")
+                source_used.encrypt_metadata("used_keys")
+
+        if self.open_db.working_copy is not None:
+            self.open_db.working_copy.flush()
+
+        diff = merger.merge(dry_run=True)
+        secho(f"New accounts: {diff['new_accounts']}, New keys: {diff['add_keys']}, "
+              f"Consumed elsewhere: {diff['remove_keys']}, New used keys: {diff['new_used']}", fg="blue")
+        if not any(diff.values()):
+            secho("Vaults are already in sync", fg="green")
+            return
+
+        secho("apply merge? (y/n): ", fg="yellow", nl=False)
+        if prompt("").strip().lower() != "y":
+            secho("Merge cancelled", fg="yellow")
+            return
+
+        merger.merge()
+        if self.open_db.working_copy is not None:
+            self.open_db.working_copy.reload()
+        secho("Merge applied successfully", fg="green")
+
     def all_backup_keys(self) -> None:
         backup_keys = self.encrypted_db.get_all_backup_keys()
         accounts = {acc[2]: (acc[0], acc[1]) for acc in self.open_db.get_all_accounts()}
@@ -0,0 +1,220 @@
+from sqlite3 import connect, Connection, Cursor
+from contextlib import closing
+from pathlib import Path
+from hashlib import sha256
+from typing import Union, List, Optional, Sequence
+
+MERKLE_DEPTH: int = 32
+
+# Hash of an all-empty subtree at each level, so absent nodes need not be stored
+EMPTY_HASHES: List[bytes] = [bytes(32)]
+for _level in range(MERKLE_DEPTH):
+    EMPTY_HASHES.append(sha256(b"\x01" + EMPTY_HASHES[-1] + EMPTY_HASHES[-1]).digest())
+
+
+class IntegrityIndex:
+    # Sparse Merkle tree keyed by row id; ids above 2**DEPTH are not supported
+    DEPTH: int = MERKLE_DEPTH
+    EMPTY: List[bytes] = EMPTY_HASHES
+    TABLE_COLUMNS: dict = {
+        "backup_keys": ("id", "account_id", "encrypted_value"),
+        "used_keys": ("id", "platform", "account_name", "used_key", "used_at", "lookup_hash"),
+    }
+
+    def __init__(self, db_path: Union[str, Path], table: str, read_only: bool = False) -> None:
+        if table not in self.TABLE_COLUMNS:
+            raise ValueError(f"No integrity index for table: {table}")
+
+        self.db_path = db_path
+        self.table: str = table
+        self.columns: tuple = self.TABLE_COLUMNS[table]
+        self.merkle_table: str = f"{table}_merkle"
+        self.read_only: bool = read_only
+
+    @staticmethod
+    def hash_row(row: Sequence) -> bytes:
+        return sha256(b"\x00" + "\x1f".join(str(value) for value in row).encode()).digest()
+
+    @staticmethod
+    def _hash_node(left: bytes, right: bytes) -> bytes:
+        return sha256(b"\x01" + left + right).digest()
+
+    def _connect(self) -> Connection:
+        # Read-only opens fail on a missing file instead of creating an empty database
+        if self.read_only:
+            return connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True)
+        return connect(self.db_path)
+
+    def exists(self) -> bool:
+        with closing(self._connect()) as conn:
+            result = conn.execute("""
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name = ?
+            """, (self.merkle_table,)).fetchone()
+            return result is not None
+
+    def create(self) -> bool:
+        with connect(self.db_path) as conn:
+            cursor: Cursor = conn.cursor()
+            cursor.execute("""
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name = ?
+            """, (self.merkle_table,))
+            if cursor.fetchone():
+                return False
+
+            cursor.execute(f"""
+                CREATE TABLE {self.merkle_table} (
+                    level INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    hash BLOB NOT NULL,
+                    PRIMARY KEY (level, position)) WITHOUT ROWID
+            """)
+            conn.commit()
+
+        return True
+
+    def _get(self, cursor: Cursor, level: int, position: int) -> bytes:
+        cursor.execute(f"""
+            SELECT hash FROM {self.merkle_table}
+            WHERE level = ? AND position = ?
+        """, (level, position))
+        result = cursor.fetchone()
+        return result[0] if result else self.EMPTY[level]
+
+    def _put(self, cursor: Cursor, level: int, position: int, node: bytes) -> None:
+        # Empty subtrees are implicit so the table only grows with the data
+        if node == self.EMPTY[level]:
+            cursor.execute(f"""
+                DELETE FROM {self.merkle_table}
+                WHERE level = ? AND position = ?
+            """, (level, position))
+        else:
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO {self.merkle_table}
+                (level, position, hash)
+                VALUES (?, ?, ?)
+            """, (level, position, node))
+
+        return None
+
+    def update_row(self, cursor: Cursor, row_id: int) -> None:
+        """Re-hash one row and its path to the root; call inside the writing transaction."""
+        cursor.execute(f"""
+            SELECT {", ".join(self.columns)}
+            FROM {self.table}
+            WHERE id = ?
+        """, (row_id,))
+        row = cursor.fetchone()
+
+        node: bytes = self.hash_row(row) if row else self.EMPTY[0]
+        position: int = row_id
+        for level in range(self.DEPTH):
+            self._put(cursor, level, position, node)
+            sibling: bytes = self._get(cursor, level, position ^ 1)
+            if position % 2 == 0:
+                node = self._hash_node(node, sibling)
+            else:
+                node = self._hash_node(sibling, node)
+            position //= 2
+        self._put(cursor, self.DEPTH, 0, node)
+
+        return None
+
+    def rebuild(self) -> None:
+        with connect(self.db_path) as conn:
+            cursor: Cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {self.merkle_table}")
+            cursor.execute(f"""
+                SELECT {", ".join(self.columns)}
+                FROM {self.table}
+                ORDER BY id ASC
+            """)
+            nodes: dict = {row[0]: self.hash_row(row) for row in cursor.fetchall()}
+
+            for level in range(self.DEPTH):
+                cursor.executemany(f"""
+                    INSERT INTO {self.merkle_table}
+                    (level, position, hash)
+                    VALUES (?, ?, ?)
+                """, [(level, position, node) for position, node in nodes.items()])
+
+                parents: dict = {}
+                for position in nodes:
+                    parent: int = position // 2
+                    if parent in parents:
+                        continue
+                    left: bytes = nodes.get(parent * 2, self.EMPTY[level])
+                    right: bytes = nodes.get(parent * 2 + 1, self.EMPTY[level])
+                    parents[parent] = self._hash_node(left, right)
+                nodes = parents
+
+            cursor.executemany(f"""
+                INSERT INTO {self.merkle_table}
+                (level, position, hash)
+                VALUES (?, ?, ?)
+            """, [(self.DEPTH, position, node) for position, node in nodes.items()])
+            conn.commit()
+
+        return None
+
+    def root(self) -> bytes:
+        with closing(self._connect()) as conn:
+            return self._get(conn.cursor(), self.DEPTH, 0)
+
+    def diff(self, other: "IntegrityIndex") -> List[int]:
+        """Row ids whose leaves differ between two copies, descending only into mismatched subtrees."""
+        flagged: List[int] = []
+        with closing(self._connect()) as conn, closing(other._connect()) as other_conn:
+            cursor: Cursor = conn.cursor()
+            other_cursor: Cursor = other_conn.cursor()
+
+            stack: List[tuple[int, int]] = [(self.DEPTH, 0)]
+            while stack:
+                level, position = stack.pop()
+                if self._get(cursor, level, position) == other._get(other_cursor, level, position):
+                    continue
+                if level == 0:
+                    flagged.append(position)
+                    continue
+                stack.append((level - 1, position * 2 + 1))
+                stack.append((level - 1, position * 2))
+
+        return flagged
+
+    def scan(self) -> List[int]:
+        """Row ids whose content no longer matches the stored leaf hash (no decryption needed)."""
+        flagged: List[int] = []
+        with closing(self._connect()) as conn:
+            cursor: Cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {", ".join("t." + column for column in self.columns)}, m.hash
+                FROM {self.table} t
+                LEFT JOIN {self.merkle_table} m ON m.level = 0 AND m.position = t.id
+                ORDER BY t.id ASC
+            """)
+            for row in cursor:
+                if row[-1] != self.hash_row(row[:-1]):
+                    flagged.append(row[0])
+
+            cursor.execute(f"""
+                SELECT position FROM {self.merkle_table}
+                WHERE level = 0 AND position NOT IN (SELECT id FROM {self.table})
+            """)
+            flagged.extend(row[0] for row in cursor.fetchall())
+
+        return sorted(flagged)
+
+    def flagged_rows(self, row_ids: List[int]) -> List[Optional[tuple]]:
+        rows: List[Optional[tuple]] = []
+        with closing(self._connect()) as conn:
+            cursor: Cursor = conn.cursor()
+            for row_id in row_ids:
+                cursor.execute(f"""
+                    SELECT {", ".join(self.columns)}
+                    FROM {self.table}
+                    WHERE id = ?
+                """, (row_id,))
+                rows.append(cursor.fetchone())
+
+        return rows
@@ -0,0 +1,79 @@
+from base64 import b64decode
+from binascii import Error as Base64Error
+from functools import lru_cache
+from json import load
+from pathlib import Path
+from typing import Union
+
+
+class Settings:
+    REQUIRED: dict = {
+        "master_key_salt": str,
+        "argon2_time_cost": int,
+        "argon2_memory_cost": int,
+        "argon2_parallelism": int,
+        "argon2_length": int,
+    }
+    OPTIONAL: dict = {
+        "working_copy": (bool, False),
+        "working_copy_flush_interval": ((int, float), 60),
+        "working_copy_flush_every": (int, 25),
+        "encrypted_metadata": (bool, False),
+    }
+    # Zero or negative would flush on every write and defeat the working copy
+    POSITIVE: tuple = ("working_copy_flush_interval", "working_copy_flush_every")
+
+    def __init__(self, values: dict, source: Union[str, Path] = "settings") -> None:
+        for key, expected in self.REQUIRED.items():
+            if key not in values:
+                raise ValueError(f"Missing setting in {source}: {key}")
+            self._check_type(source, key, values[key], expected)
+
+        for key, (expected, _) in self.OPTIONAL.items():
+            if key in values and values[key] is not None:
+                self._check_type(source, key, values[key], expected)
+
+        for key in self.POSITIVE:
+            if key in values and values[key] is not None and values[key] <= 0:
+                raise ValueError(f"Invalid setting in {source}: {key} must be positive")
+
+        try:
+            self.salt: bytes = b64decode(values["master_key_salt"])
+        except Base64Error:
+            raise ValueError(f"Invalid setting in {source}: master_key_salt must be base64")
+
+        self.values: dict = values
+        self.argon2_time_cost: int = values["argon2_time_cost"]
+        self.argon2_memory_cost: int = values["argon2_memory_cost"]
+        self.argon2_parallelism: int = values["argon2_parallelism"]
+        self.argon2_length: int = values["argon2_length"]
+
+        self.working_copy: bool = self._optional("working_copy")
+        self.working_copy_flush_interval: float = self._optional("working_copy_flush_interval")
+        self.working_copy_flush_every: int = self._optional("working_copy_flush_every")
+        self.encrypted_metadata: bool = self._optional("encrypted_metadata")
+
+    @staticmethod
+    def _check_type(source: Union[str, Path], key: str, value, expected) -> None:
+        # bool is a subclass of int, so reject it explicitly for numeric settings
+        if isinstance(value, bool) and expected is not bool:
+            raise ValueError(f"Invalid setting in {source}: {key} must be a number")
+        if not isinstance(value, expected):
+            raise ValueError(f"Invalid setting in {source}: {key} has the wrong type")
+
+        return None
+
+    def _optional(self, key: str):
+        value = self.values.get(key)
+        return self.OPTIONAL[key][1] if value is None else value
+
+
+@lru_cache(maxsize=None)
+def _load_settings(config_path: Path) -> Settings:
+    with open(config_path, "r") as f:
+        return Settings(load(f), source=config_path)
+
+
+def load_settings(config_path: Union[str, Path] = Path("config/settings.json")) -> Settings:
+    """Read and validate settings.json once per process; later calls reuse the parsed object."""
+    return _load_settings(Path(config_path).resolve())
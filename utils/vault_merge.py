@@ -0,0 +1,282 @@
+from sqlite3 import connect, Connection, Cursor
+from pathlib import Path
+from hashlib import sha256
+from contextlib import closing
+from typing import Union, Iterator, Iterable, Callable, Optional, Any, TYPE_CHECKING
+
+from utils.integrity import IntegrityIndex
+
+if TYPE_CHECKING:
+    from encryption.crypto_handler import CryptoHandler
+
+
+def consumed_key_hash(encrypted_value: str) -> str:
+    return sha256(encrypted_value.encode()).hexdigest()
+
+
+def merge_sorted(left: Iterable[tuple], right: Iterable[tuple],
+                 key: Callable[[tuple], Any]) -> Iterator[tuple[Optional[tuple], Optional[tuple]]]:
+    """Merge-join two streams already sorted by key, yielding (left, right) with None on the missing side."""
+    left_iter, right_iter = iter(left), iter(right)
+    left_row, right_row = next(left_iter, None), next(right_iter, None)
+
+    while left_row is not None or right_row is not None:
+        if right_row is None or (left_row is not None and key(left_row) < key(right_row)):
+            yield left_row, None
+            left_row = next(left_iter, None)
+        elif left_row is None or key(right_row) < key(left_row):
+            yield None, right_row
+            right_row = next(right_iter, None)
+        else:
+            yield left_row, right_row
+            left_row, right_row = next(left_iter, None), next(right_iter, None)
+
+
+class VaultMerger:
+    # Encrypted names differ per copy, so accounts are matched on the blind index when present
+    IDENTITY: str = "COALESCE(lookup_hash, platform || char(31) || account_name)"
+    ACCOUNTS_QUERY: str = f"""
+        SELECT {IDENTITY} AS identity, platform, account_name, lookup_hash
+        FROM accounts
+        ORDER BY identity
+    """
+    BACKUP_KEYS_QUERY: str = """
+        SELECT b.encrypted_value, b.id, b.account_id, a.platform, a.account_name, a.lookup_hash
+        FROM enc_index.backup_keys b
+        JOIN accounts a ON a.id = b.account_id
+        ORDER BY b.encrypted_value
+    """
+    USED_KEYS_QUERY: str = f"""
+        SELECT {IDENTITY} AS identity, used_at, used_key, platform, account_name, lookup_hash
+        FROM used_index.used_keys
+        ORDER BY identity, used_at, used_key
+    """
+    CONSUMED_KEYS_QUERY: str = """
+        SELECT value_hash
+        FROM enc_index.consumed_keys
+        ORDER BY value_hash
+    """
+
+    def __init__(self, target_dir: Union[str, Path], source_dir: Union[str, Path],
+                 crypto_handler: "CryptoHandler") -> None:
+        self.target_dir: Path = Path(target_dir)
+        self.source_dir: Path = Path(source_dir)
+        self.crypto_handler: "CryptoHandler" = crypto_handler
+
+        for db_dir in (self.target_dir, self.source_dir):
+            for name in ("open_index.db", "encrypted_index.db", "used_index.db"):
+                if not (db_dir / name).exists():
+                    raise FileNotFoundError(f"Vault database not found: {db_dir / name}")
+
+    @staticmethod
+    def _open(db_dir: Path) -> Connection:
+        conn: Connection = connect(db_dir / "open_index.db", isolation_level=None)
+        conn.execute("ATTACH DATABASE ? AS enc_index", (str(db_dir / "encrypted_index.db"),))
+        conn.execute("ATTACH DATABASE ? AS used_index", (str(db_dir / "used_index.db"),))
+        return conn
+
+    @staticmethod
+    def _is_consumed(cursor: Cursor, encrypted_value: str) -> bool:
+        cursor.execute("""
+            SELECT 1 FROM enc_index.consumed_keys
+            WHERE value_hash = ?
+        """, (consumed_key_hash(encrypted_value),))
+        return cursor.fetchone() is not None
+
+    def _is_archived(self, cursor: Cursor, account: tuple, encrypted_value: str) -> bool:
+        """True if the key was already viewed on this copy, including before tombstones existed."""
+        decrypted_key: Optional[bytes] = self.crypto_handler.decrypt(encrypted_value, quiet=True)
+        if decrypted_key is None:
+            return False
+
+        platform, account_name, lookup_hash = account
+        if lookup_hash is not None:
+            condition, params = "lookup_hash = ?", (lookup_hash,)
+        else:
+            condition, params = "platform = ? AND account_name = ?", (platform, account_name)
+        cursor.execute(f"""
+            SELECT 1 FROM used_index.used_keys
+            WHERE {condition} AND used_key = ?
+            LIMIT 1
+        """, params + (decrypted_key.decode(),))
+        return cursor.fetchone() is not None
+
+    def sample_source_key(self) -> Optional[str]:
+        uri = f"{(self.source_dir / 'encrypted_index.db').resolve().as_uri()}?mode=ro"
+        with closing(connect(uri, uri=True)) as conn:
+            result = conn.execute("SELECT encrypted_value FROM backup_keys LIMIT 1").fetchone()
+            return result[0] if result else None
+
+    def _stage(self, staging: Cursor) -> None:
+        staging.execute("CREATE TABLE staging.new_accounts (platform TEXT, account_name TEXT, lookup_hash TEXT)")
+        staging.execute("CREATE TABLE staging.new_consumed (value_hash TEXT)")
+        staging.execute("CREATE TABLE staging.add_keys "
+                        "(platform TEXT, account_name TEXT, lookup_hash TEXT, encrypted_value TEXT)")
+        staging.execute("CREATE TABLE staging.remove_keys (id INTEGER, account_id INTEGER)")
+        staging.execute("CREATE TABLE staging.new_used "
+                        "(platform TEXT, account_name TEXT, lookup_hash TEXT, used_at TIMESTAMP, used_key TEXT)")
+
+        target_read: Connection = self._open(self.target_dir)
+        source_read: Connection = self._open(self.source_dir)
+        target_lookup: Cursor = target_read.cursor()
+        source_lookup: Cursor = source_read.cursor()
+
+        try:
+            for target_row, source_row in merge_sorted(
+                    target_read.execute(self.ACCOUNTS_QUERY),
+                    source_read.execute(self.ACCOUNTS_QUERY), key=lambda row: row[0]):
+                if target_row is None:
+                    staging.execute("INSERT INTO staging.new_accounts VALUES (?, ?, ?)", source_row[1:])
+
+            for target_row, source_row in merge_sorted(
+                    target_read.execute(self.CONSUMED_KEYS_QUERY),
+                    source_read.execute(self.CONSUMED_KEYS_QUERY), key=lambda row: row):
+                if target_row is None:
+                    staging.execute("INSERT INTO staging.new_consumed VALUES (?)", source_row)
+
+            for target_row, source_row in merge_sorted(
+                    target_read.execute(self.BACKUP_KEYS_QUERY),
+                    source_read.execute(self.BACKUP_KEYS_QUERY), key=lambda row: row[0]):
+                if source_row is None:
+                    encrypted_value, backup_key_id, account_id = target_row[:3]
+                    # Consumed on the source copy; drop it here too so it is never issued twice
+                    if self._is_consumed(source_lookup, encrypted_value):
+                        staging.execute("INSERT INTO staging.remove_keys VALUES (?, ?)",
+                                        (backup_key_id, account_id))
+                    elif self._is_archived(source_lookup, target_row[3:], encrypted_value):
+                        # Viewed on the source before tombstones existed; record the tombstone now
+                        staging.execute("INSERT INTO staging.remove_keys VALUES (?, ?)",
+                                        (backup_key_id, account_id))
+                        staging.execute("INSERT INTO staging.new_consumed VALUES (?)",
+                                        (consumed_key_hash(encrypted_value),))
+
+                elif target_row is None:
+                    encrypted_value = source_row[0]
+                    if self._is_consumed(target_lookup, encrypted_value):
+                        continue
+                    if self._is_archived(target_lookup, source_row[3:], encrypted_value):
+                        staging.execute("INSERT INTO staging.new_consumed VALUES (?)",
+                                        (consumed_key_hash(encrypted_value),))
+                        continue
+                    staging.execute("INSERT INTO staging.add_keys VALUES (?, ?, ?, ?)",
+                                    source_row[3:] + (encrypted_value,))
+
+            for target_row, source_row in merge_sorted(
+                    target_read.execute(self.USED_KEYS_QUERY),
+                    source_read.execute(self.USED_KEYS_QUERY), key=lambda row: row[:3]):
+                if target_row is None:
+                    staging.execute("INSERT INTO staging.new_used VALUES (?, ?, ?, ?, ?)",
+                                    source_row[3:] + source_row[1:3])
+        finally:
+            target_read.close()
+            source_read.close()
+
+        return None
+
+    @staticmethod
+    def _staged_rows(cursor: Cursor, table: str, columns: str, page_size: int = 1000) -> Iterator[tuple]:
+        # Page through staged rows by rowid so the apply phase stays in bounded memory too
+        last_id: int = 0
+        while True:
+            batch = cursor.execute(f"""
+                SELECT rowid, {columns}
+                FROM staging.{table}
+                WHERE rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+            """, (last_id, page_size)).fetchall()
+            if not batch:
+                return
+            for row in batch:
+                last_id = row[0]
+                yield row[1:]
+
+    def _apply(self, cursor: Cursor) -> None:
+        backup_index = IntegrityIndex(self.target_dir / "encrypted_index.db", "backup_keys")
+        used_index = IntegrityIndex(self.target_dir / "used_index.db", "used_keys")
+
+        cursor.execute("""
+            INSERT INTO accounts
+            (platform, account_name, lookup_hash)
+            SELECT platform, account_name, lookup_hash FROM staging.new_accounts
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO enc_index.consumed_keys
+            (value_hash)
+            SELECT value_hash FROM staging.new_consumed
+        """)
+
+        for backup_key_id, account_id in self._staged_rows(cursor, "remove_keys", "id, account_id"):
+            cursor.execute("""
+                DELETE FROM enc_index.backup_keys
+                WHERE id = ?
+            """, (backup_key_id,))
+            backup_index.update_row(cursor, backup_key_id)
+            cursor.execute("""
+                UPDATE accounts
+                SET key_count = key_count - 1
+                WHERE id = ?
+            """, (account_id,))
+
+        for platform, account_name, lookup_hash, encrypted_value in self._staged_rows(
+                cursor, "add_keys", "platform, account_name, lookup_hash, encrypted_value"):
+            if lookup_hash is not None:
+                cursor.execute("SELECT id FROM accounts WHERE lookup_hash = ?", (lookup_hash,))
+            else:
+                cursor.execute("""
+                    SELECT id
+                    FROM accounts
+                    WHERE platform = ? AND account_name = ?
+                """, (platform, account_name))
+            account_id = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO enc_index.backup_keys
+                (account_id, encrypted_value)
+                VALUES (?, ?)
+            """, (account_id, encrypted_value))
+            backup_index.update_row(cursor, cursor.lastrowid)
+            cursor.execute("""
+                UPDATE accounts
+                SET key_count = key_count + 1
+                WHERE id = ?
+            """, (account_id,))
+
+        for used_row in self._staged_rows(
+                cursor, "new_used", "platform, account_name, lookup_hash, used_at, used_key"):
+            cursor.execute("""
+                INSERT INTO used_index.used_keys
+                (platform, account_name, lookup_hash, used_at, used_key)
+                VALUES (?, ?, ?, ?, ?)
+            """, used_row)
+            used_index.update_row(cursor, cursor.lastrowid)
+
+        return None
+
+    def merge(self, dry_run: bool = False) -> dict:
+        """Pull rows from the source vault into the target in one transaction; returns per-kind counts."""
+        writer: Connection = self._open(self.target_dir)
+        # Diffs are staged in a private temporary database, never held in Python memory
+        writer.execute("ATTACH DATABASE '' AS staging")
+        cursor: Cursor = writer.cursor()
+
+        try:
+            self._stage(cursor)
+
+            counts: dict = {}
+            for table in ("new_accounts", "add_keys", "remove_keys", "new_consumed", "new_used"):
+                counts[table] = cursor.execute(f"SELECT COUNT(*) FROM staging.{table}").fetchone()[0]
+
+            if dry_run:
+                return counts
+
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._apply(cursor)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            writer.close()
+
+        return counts
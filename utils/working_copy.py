@@ -0,0 +1,202 @@
+from sqlite3 import connect, Connection
+from pathlib import Path
+from json import dumps, loads
+from os import fsync
+from time import monotonic
+from typing import Union, List, Optional, Callable, TYPE_CHECKING
+from click import secho
+
+if TYPE_CHECKING:
+    from encryption.metadata_cipher import MetadataCipher
+
+
+class WorkingCopy:
+    """In-memory copy of the vault databases, written back to the USB files in batches.
+
+    Every write is appended to an fsync'd journal before it touches RAM, and each
+    database file records the last journal sequence it contains, so a crash between
+    flushes is replayed exactly once on the next unlock.
+    """
+
+    def __init__(self, db_paths: List[Path], journal_path: Path,
+                 flush_interval: Optional[float] = 60.0, flush_every: Optional[int] = 25,
+                 metadata_cipher: Optional["MetadataCipher"] = None) -> None:
+        self.db_paths: List[Path] = [Path(db_path).resolve() for db_path in db_paths]
+        self.journal_path: Path = journal_path
+        self.flush_interval: Optional[float] = flush_interval
+        self.flush_every: Optional[int] = flush_every
+        self.metadata_cipher: Optional["MetadataCipher"] = metadata_cipher
+
+        self.connections: dict = {}
+        self.flushed_seq: dict = {}
+        self.seq: int = 0
+        self.pending_writes: int = 0
+        self.last_flush: float = monotonic()
+        self.replaying: bool = False
+
+    def uri(self, db_path: Union[str, Path]) -> str:
+        return f"file:working_copy_{id(self)}_{Path(db_path).stem}?mode=memory&cache=shared"
+
+    def connect(self, db_path: Union[str, Path]) -> Connection:
+        return connect(self.uri(db_path), uri=True)
+
+    def load(self, replay: Callable[[Path, str, list], None]) -> None:
+        for db_path in self.db_paths:
+            # The first connection keeps the shared in-memory database alive
+            memory_conn: Connection = self.connect(db_path)
+            file_conn: Connection = connect(db_path)
+            file_conn.backup(memory_conn)
+            file_conn.close()
+
+            memory_conn.execute("""
+                CREATE TABLE IF NOT EXISTS working_copy_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL)
+            """)
+            result = memory_conn.execute("""
+                SELECT value FROM working_copy_meta
+                WHERE key = 'flushed_seq'
+            """).fetchone()
+            memory_conn.commit()
+
+            self.connections[db_path] = memory_conn
+            self.flushed_seq[db_path] = result[0] if result else 0
+
+        self.seq = max(self.flushed_seq.values(), default=0)
+        self._replay_journal(replay)
+
+        return None
+
+    def _replay_journal(self, replay: Callable[[Path, str, list], None]) -> None:
+        if not self.journal_path.exists():
+            return None
+
+        replayed: int = 0
+        skipped: int = 0
+        self.replaying = True
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        entry: dict = loads(line)
+                    except ValueError:
+                        # A torn final line was never acknowledged, so the write never happened
+                        break
+                    db_path: Path = Path(entry["db"]).resolve()
+                    self.seq = max(self.seq, entry["seq"])
+                    if entry["seq"] <= self.flushed_seq.get(db_path, entry["seq"]):
+                        continue
+                    if "sealed" in entry:
+                        args: list = loads(self.metadata_cipher.decrypt(entry["sealed"]))
+                    else:
+                        args = entry["args"]
+                    try:
+                        replay(db_path, entry["op"], args)
+                    except Exception as e:
+                        # One bad entry must not lock the user out of the whole vault
+                        secho(f"Skipped journal entry {entry['seq']} ({entry['op']}): {e}", fg="red")
+                        skipped += 1
+                        continue
+                    replayed += 1
+        finally:
+            self.replaying = False
+
+        if replayed:
+            secho(f"Recovered {replayed} unflushed write(s) from {self.journal_path}", fg="yellow")
+            self.pending_writes = replayed
+        if skipped:
+            secho(f"{skipped} journal entry(s) could not be replayed and were dropped", fg="red")
+        self.flush(force=True)
+
+        return None
+
+    def log(self, db_path: Union[str, Path], op: str, args: tuple) -> Optional[int]:
+        """Append one write to the journal; returns the prior journal size for discard()."""
+        if self.replaying:
+            return None
+
+        self.seq += 1
+        entry: dict = {"seq": self.seq, "db": str(db_path), "op": op, "args": list(args)}
+        if self.metadata_cipher is not None:
+            # Keep account names out of the plaintext journal when metadata is encrypted
+            entry["sealed"] = self.metadata_cipher.encrypt(dumps(entry.pop("args")))
+        with open(self.journal_path, "a") as f:
+            offset: int = f.tell()
+            f.write(dumps(entry) + "\n")
+            f.flush()
+            fsync(f.fileno())
+
+        return offset
+
+    def discard(self, offset: int) -> None:
+        """Drop the last journal entry after its write failed, so it is never replayed."""
+        with open(self.journal_path, "r+") as f:
+            f.truncate(offset)
+            f.flush()
+            fsync(f.fileno())
+        self.seq -= 1
+
+        return None
+
+    def record_write(self) -> None:
+        if self.replaying:
+            return None
+
+        self.pending_writes += 1
+        self.maybe_flush()
+
+        return None
+
+    def maybe_flush(self) -> None:
+        if self.flush_every is not None and self.pending_writes >= self.flush_every:
+            self.flush()
+        elif self.flush_interval is not None and monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+        return None
+
+    def flush(self, force: bool = False) -> None:
+        if not self.pending_writes and not force:
+            self.last_flush = monotonic()
+            return None
+
+        for db_path, memory_conn in self.connections.items():
+            # The sequence marker is copied with the pages, so each file flips atomically
+            memory_conn.execute("""
+                INSERT OR REPLACE INTO working_copy_meta
+                (key, value)
+                VALUES ('flushed_seq', ?)
+            """, (self.seq,))
+            memory_conn.commit()
+
+            file_conn: Connection = connect(db_path)
+            memory_conn.backup(file_conn)
+            file_conn.close()
+            self.flushed_seq[db_path] = self.seq
+
+        with open(self.journal_path, "w") as f:
+            f.flush()
+            fsync(f.fileno())
+
+        self.pending_writes = 0
+        self.last_flush = monotonic()
+
+        return None
+
+    def reload(self) -> None:
+        """Re-read the files after something outside the working copy wrote to them."""
+        self.flush()
+        for db_path, memory_conn in self.connections.items():
+            file_conn: Connection = connect(db_path)
+            file_conn.backup(memory_conn)
+            file_conn.close()
+
+        return None
+
+    def close(self) -> None:
+        self.flush()
+        for memory_conn in self.connections.values():
+            memory_conn.close()
+        self.connections = {}
+
+        return None